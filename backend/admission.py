@@ -0,0 +1,232 @@
+"""
+洋葱热点灵感捕手 - 请求准入控制
+Onion Daily Trend Catcher - Request Admission Control
+
+Protects the upstream platforms (and our egress IP) from bursts of live
+scrapes, and keeps one noisy client from starving the rest:
+
+    - Per-client token buckets limit how often a client may trigger a scrape
+    - A global gate caps concurrent upstream scrapes
+    - Waiters on the gate are served by priority (interactive before background)
+    - When a client is over budget or the queue is full, the request is shed:
+      the caller serves stale data with Retry-After instead of queueing
+
+Health checks and reads that the snapshot can answer never touch the gate,
+so they always go ahead of any scrape.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Dict, List, Optional
+
+# ============================================
+# Configuration
+# ============================================
+
+# Snapshot age (seconds) under which reads are served without scraping
+SNAPSHOT_TTL = float(os.environ.get("SNAPSHOT_TTL", "60"))
+
+# Sustained live scrapes per second a single client may trigger, and burst size
+CLIENT_RATE = float(os.environ.get("CLIENT_RATE", "0.2"))
+CLIENT_BURST = float(os.environ.get("CLIENT_BURST", "3"))
+
+# Concurrent upstream scrapes across all clients, and how many may wait for one
+MAX_CONCURRENT_SCRAPES = int(os.environ.get("MAX_CONCURRENT_SCRAPES", "2"))
+MAX_QUEUED_SCRAPES = int(os.environ.get("MAX_QUEUED_SCRAPES", "8"))
+
+# Number of client buckets kept before the least recently used are dropped
+MAX_TRACKED_CLIENTS = 10_000
+
+# Retry-After (seconds) suggested when the scrape queue is full
+QUEUE_FULL_RETRY_AFTER = 5
+
+
+class Priority(IntEnum):
+    """Gate priorities; lower values are admitted first"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class Shed(Exception):
+    """Request was not admitted; serve stale data or ask the client to retry"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# ============================================
+# Per-Client Token Buckets
+# ============================================
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: Optional[float] = None) -> float:
+        """
+        Take one token
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self) -> None:
+        """Give back a token taken for a request that was shed later on"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class ClientBuckets:
+    """Token buckets keyed by client, bounded by least-recently-used eviction"""
+
+    def __init__(self, rate: float = CLIENT_RATE, capacity: float = CLIENT_BURST,
+                 max_clients: int = MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, client: str) -> float:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.capacity)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take()
+
+    def refund(self, client: str) -> None:
+        bucket = self._buckets.get(client)
+        if bucket is not None:
+            bucket.refund()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# ============================================
+# Priority Gate
+# ============================================
+
+class PriorityGate:
+    """
+    Async semaphore whose waiters are woken in priority order
+
+    A bounded number of callers may wait; beyond that `acquire` sheds
+    immediately instead of growing the queue.
+    """
+
+    def __init__(self, capacity: int = MAX_CONCURRENT_SCRAPES, max_waiting: int = MAX_QUEUED_SCRAPES):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: Priority) -> None:
+        if self.active < self.capacity and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            raise Shed("upstream queue full", QUEUE_FULL_RETRY_AFTER)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [int(priority), next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before cancellation; pass it on
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self) -> None:
+        # Hand the slot straight to the best waiter so nobody can barge in
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+# ============================================
+# Admission Controller
+# ============================================
+
+class AdmissionController:
+    def __init__(self, buckets: Optional[ClientBuckets] = None, gate: Optional[PriorityGate] = None,
+                 ttl: float = SNAPSHOT_TTL):
+        self.buckets = buckets or ClientBuckets()
+        self.gate = gate or PriorityGate()
+        self.ttl = ttl
+        self.shed_count: Dict[str, int] = {}
+
+    def is_fresh(self, fetched_at: Optional[float]) -> bool:
+        return fetched_at is not None and time.time() - fetched_at < self.ttl
+
+    def check_client(self, client: str) -> None:
+        """Charge one live scrape to `client`, raising Shed if over budget"""
+        wait = self.buckets.take(client)
+        if wait > 0:
+            self._shed("client rate limited")
+            raise Shed("client rate limited", wait)
+
+    @asynccontextmanager
+    async def upstream_slot(self, priority: Priority = Priority.INTERACTIVE,
+                            client: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Hold one of the global upstream scrape slots
+
+        If the gate sheds, the token `client` was charged by `check_client`
+        is refunded: a request that never reached upstream costs nothing.
+        """
+        try:
+            await self.gate.acquire(priority)
+        except Shed as e:
+            self._shed(e.reason)
+            if client is not None:
+                self.buckets.refund(client)
+            raise
+        try:
+            yield
+        finally:
+            self.gate.release()
+
+    def _shed(self, reason: str) -> None:
+        self.shed_count[reason] = self.shed_count.get(reason, 0) + 1
+
+    def stats(self) -> Dict:
+        return {
+            "active_scrapes": self.gate.active,
+            "queued_scrapes": self.gate.waiting,
+            "tracked_clients": len(self.buckets),
+            "shed": dict(self.shed_count),
+        }
@@ -0,0 +1,220 @@
+"""
+洋葱热点灵感捕手 - 历史热点批量导出
+Onion Daily Trend Catcher - Bulk Snapshot Export
+
+Streams recorded history (see history.py) as:
+    - jsonl:   gzip-compressed JSON lines, flushed every chunk
+    - parquet: Parquet row groups, dictionary-encoded source/category
+    - arrow:   Arrow IPC stream of record batches
+
+Every format is produced as an iterator of byte chunks, one chunk per
+`chunk_rows` rows, so neither the CLI nor /api/export ever holds more
+than one chunk of the dataset in memory.
+
+Run:
+    python export.py --format parquet --output trends.parquet --since 2026-01-01
+    python trend_service.py export --format jsonl --output trends.jsonl.gz
+"""
+
+import argparse
+import io
+import json
+import sys
+import zlib
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from history import iter_history, parse_time
+
+# ============================================
+# Configuration
+# ============================================
+
+# Rows per gzip flush / Parquet row group / Arrow record batch
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Column order for columnar formats
+COLUMNS = [
+    "snapshot_ts", "id", "title", "url", "source",
+    "category", "hot_score", "is_k12_related", "fetched_at",
+]
+
+
+def _chunks(rows: Iterable[Dict], chunk_rows: int) -> Iterator[List[Dict]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ============================================
+# JSON Lines (gzip)
+# ============================================
+
+def stream_jsonl(rows: Iterable[Dict], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a gzip stream of JSON lines, one compressed block per chunk"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in _chunks(rows, chunk_rows):
+        data = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk)
+        block = compressor.compress(data.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if block:
+            yield block
+    yield compressor.flush()
+
+
+# ============================================
+# Columnar (Parquet / Arrow)
+# ============================================
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("pyarrow is required for parquet/arrow export: pip install -r requirements.txt")
+    return pyarrow
+
+
+def arrow_schema():
+    pa = _require_pyarrow()
+    return pa.schema([
+        ("snapshot_ts", pa.float64()),
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("url", pa.string()),
+        ("source", pa.dictionary(pa.int8(), pa.string())),
+        ("category", pa.dictionary(pa.int8(), pa.string())),
+        ("hot_score", pa.int32()),
+        ("is_k12_related", pa.bool_()),
+        ("fetched_at", pa.float64()),
+    ])
+
+
+def _to_table(chunk: List[Dict], schema):
+    pa = _require_pyarrow()
+    columns = {name: [row.get(name) for row in chunk] for name in COLUMNS}
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each chunk"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_parquet(rows: Iterable[Dict], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a Parquet file, one row group per chunk"""
+    pa = _require_pyarrow()
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.parquet.ParquetWriter(
+        sink,
+        schema,
+        compression="zstd",
+        use_dictionary=["source", "category"],
+    )
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            writer.write_table(_to_table(chunk, schema), row_group_size=chunk_rows)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_arrow(rows: Iterable[Dict], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream, one record batch per chunk"""
+    pa = _require_pyarrow()
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            writer.write_table(_to_table(chunk, schema), max_chunksize=chunk_rows)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# Format name -> (streamer, media type, file extension)
+FORMATS: Dict[str, tuple] = {
+    "jsonl": (stream_jsonl, "application/gzip", ".jsonl.gz"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet", ".parquet"),
+    "arrow": (stream_arrow, "application/vnd.apache.arrow.stream", ".arrows"),
+}
+
+
+def stream_export(
+    fmt: str,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    sources: Optional[Iterable[str]] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """Stream history in the given format"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    streamer: Callable[..., Iterator[bytes]] = FORMATS[fmt][0]
+    if fmt != "jsonl":
+        _require_pyarrow()
+    return streamer(iter_history(since, until, sources), chunk_rows)
+
+
+# ============================================
+# CLI
+# ============================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export collected trend snapshots")
+    parser.add_argument("--format", choices=list(FORMATS), default="jsonl")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Output path (default: trends<ext>, '-' for stdout)")
+    parser.add_argument("--since", type=parse_time, default=None, help="Unix timestamp or ISO date")
+    parser.add_argument("--until", type=parse_time, default=None, help="Unix timestamp or ISO date")
+    parser.add_argument("--source", action="append", default=None,
+                        help="Only export this source (repeatable)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Rows per compressed block / row group")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"trends{FORMATS[args.format][2]}"
+
+    try:
+        chunks = stream_export(args.format, args.since, args.until, args.source, args.chunk_rows)
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    total = 0
+    out = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            total += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    if output != "-":
+        print(f"✅ Exported {total / 1024:.1f} KiB to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
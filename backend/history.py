@@ -0,0 +1,129 @@
+"""
+洋葱热点灵感捕手 - 热点历史快照
+Onion Daily Trend Catcher - Snapshot History
+
+Every aggregation is appended to a per-day JSON lines file under
+HISTORY_DIR, one row per trend tagged with its `snapshot_ts`. Reads are
+streamed file by file, line by line, so history of any length can be
+scanned with constant memory.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# ============================================
+# Configuration
+# ============================================
+
+# Directory for history files; set to an empty string to disable recording
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history"))
+
+HISTORY_SUFFIX = ".jsonl"
+
+_write_lock = threading.Lock()
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def parse_time(value: str) -> float:
+    """Parse a unix timestamp or an ISO date/datetime (UTC if naive)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+# ============================================
+# Recording
+# ============================================
+
+def record_snapshot(trends: List[Dict], snapshot_ts: Optional[float] = None) -> None:
+    """Append one aggregation snapshot to today's history file"""
+    if not HISTORY_DIR or not trends:
+        return
+
+    snapshot_ts = time.time() if snapshot_ts is None else snapshot_ts
+    lines = "".join(
+        json.dumps({"snapshot_ts": snapshot_ts, **trend}, ensure_ascii=False) + "\n"
+        for trend in trends
+    )
+    path = os.path.join(HISTORY_DIR, _day(snapshot_ts) + HISTORY_SUFFIX)
+
+    try:
+        with _write_lock:
+            os.makedirs(HISTORY_DIR, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+    except OSError as e:
+        logger.warning("history_write_failed", path=path, error=str(e))
+
+
+# ============================================
+# Reading
+# ============================================
+
+def history_files(since: Optional[float] = None, until: Optional[float] = None) -> List[str]:
+    """History files overlapping [since, until], oldest first"""
+    if not HISTORY_DIR or not os.path.isdir(HISTORY_DIR):
+        return []
+
+    first = _day(since) if since is not None else None
+    last = _day(until) if until is not None else None
+    files = []
+    for name in sorted(os.listdir(HISTORY_DIR)):
+        if not name.endswith(HISTORY_SUFFIX):
+            continue
+        day = name[:-len(HISTORY_SUFFIX)]
+        if (first and day < first) or (last and day > last):
+            continue
+        files.append(os.path.join(HISTORY_DIR, name))
+    return files
+
+
+def iter_history(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    sources: Optional[Iterable[str]] = None,
+) -> Iterator[Dict]:
+    """
+    Stream recorded trend rows in snapshot order
+
+    Args:
+        since: Only rows with snapshot_ts >= since
+        until: Only rows with snapshot_ts <= until
+        sources: Only rows from these sources
+    """
+    sources = set(sources) if sources else None
+    for path in history_files(since, until):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-append can leave a truncated last line
+                    logger.warning("history_bad_line", path=path)
+                    continue
+                ts = row.get("snapshot_ts", 0)
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    continue
+                if sources and row.get("source") not in sources:
+                    continue
+                yield row
@@ -0,0 +1,490 @@
+"""
+洋葱热点灵感捕手 - 压力测试工具
+Onion Daily Trend Catcher - Load Testing Harness
+
+Drives `main:app` in-process with concurrent async clients while the four
+upstream platforms are replaced by stand-ins with programmable latency and
+error rates. The real scrapers still run, so HTML/JSON parsing cost is part
+of the measurement; only the network is faked.
+
+Run:
+    python loadtest.py --concurrency 50 --duration 30
+    python loadtest.py --mix trends=6,source=3,health=1 --latency 0.3 --error-rate 0.05
+    python loadtest.py --upstream zhihu:latency=1.5,error_rate=0.3
+    python loadtest.py --snapshot-ttl 0 --client-rate 100   # measure live scrapes
+
+In-process, every worker connects from its own client address, so the
+per-client token buckets behave as they would for distinct users. Each
+response is classified as live (served without the snapshot, including
+health checks), cached (snapshot hit), stale (shed but served the old
+snapshot), shed (429/503) or error.
+
+Each run appends one JSON line (tagged with the git commit) to --output so
+results can be compared across commits.
+"""
+
+import os
+import tempfile
+
+# Keep per-request logs out of the way of the report and load-test snapshots
+# out of the real history and checkpoint; must precede app imports
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+_scratch_dir = tempfile.mkdtemp(prefix="onion-loadtest-")
+os.environ.setdefault("HISTORY_DIR", os.path.join(_scratch_dir, "history"))
+os.environ.setdefault("SNAPSHOT_PATH", os.path.join(_scratch_dir, "snapshot.json"))
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote, urlparse
+
+import httpx
+import numpy as np
+import requests
+
+import trend_service
+from trend_service import K12_KEYWORDS, MAX_ITEMS_PER_SOURCE
+
+# ============================================
+# Configuration
+# ============================================
+
+# Default request mix: endpoint name -> relative weight
+DEFAULT_MIX = {"trends": 6, "source": 3, "health": 1}
+
+# Default results file, one JSON line per run
+DEFAULT_OUTPUT = "loadtest_results.jsonl"
+
+# Event loop lag probe interval in seconds
+LAG_PROBE_INTERVAL = 0.01
+
+# Upstream host -> source name
+UPSTREAM_HOSTS = {
+    "s.weibo.com": "weibo",
+    "top.baidu.com": "baidu",
+    "api.zhihu.com": "zhihu",
+    "www.zhihu.com": "zhihu",
+    "news.so.com": "360",
+}
+
+# Response classes reported per endpoint
+OUTCOMES = ("live", "cached", "stale", "shed", "error")
+
+GENERIC_TOPICS = ["发布会", "新赛季", "天气预警", "演唱会", "新能源汽车", "电影票房", "旅游攻略", "科技新品"]
+
+
+# ============================================
+# Stand-in Upstreams
+# ============================================
+
+@dataclass
+class UpstreamProfile:
+    latency: float = 0.2      # mean response time in seconds
+    jitter: float = 0.1       # uniform +/- spread around the mean
+    error_rate: float = 0.0   # probability of a connection error or 503
+
+
+def _sample_titles(source: str, count: int) -> List[str]:
+    rng = random.Random(source)
+    titles = []
+    for i in range(count):
+        if rng.random() < 0.3:
+            titles.append(f"{rng.choice(K12_KEYWORDS)}相关话题{i}引热议")
+        else:
+            titles.append(f"{rng.choice(GENERIC_TOPICS)}{i}登上热搜")
+    return titles
+
+
+def _render_body(source: str, count: int) -> str:
+    """Render a page shaped like the real board so the scrapers' selectors match"""
+    titles = _sample_titles(source, count)
+
+    if source == "weibo":
+        rows = "".join(
+            f'<tr><td class="td-02"><a href="/weibo?q={quote(t)}">{t}</a></td></tr>'
+            for t in titles
+        )
+        return f"<html><body><table>{rows}</table></body></html>"
+
+    if source == "baidu":
+        cards = "".join(
+            f'<div class="content_1YWBm"><a href="https://www.baidu.com/s?wd={quote(t)}">'
+            f'<div class="c-single-text-ellipsis">{t}</div></a></div>'
+            for t in titles
+        )
+        return f"<html><body>{cards}</body></html>"
+
+    if source == "zhihu":
+        data = [
+            {"target": {"id": 1000 + i, "title": t, "type": "question",
+                        "url": f"https://www.zhihu.com/question/{1000 + i}"}}
+            for i, t in enumerate(titles)
+        ]
+        return json.dumps({"data": data}, ensure_ascii=False)
+
+    items = "".join(
+        f'<li><a href="https://www.so.com/s?q={quote(t)}">{t}</a></li>'
+        for t in titles
+    )
+    return f'<html><body><ul class="list">{items}</ul></body></html>'
+
+
+class StubUpstreams:
+    """Replacement for `requests.get` that serves canned boards"""
+
+    def __init__(self, profiles: Dict[str, UpstreamProfile], items_per_source: int = MAX_ITEMS_PER_SOURCE):
+        self.profiles = profiles
+        self.bodies = {
+            source: _render_body(source, items_per_source).encode("utf-8")
+            for source in set(UPSTREAM_HOSTS.values())
+        }
+        self.calls: Dict[str, int] = {source: 0 for source in self.bodies}
+        self.errors: Dict[str, int] = {source: 0 for source in self.bodies}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        source = UPSTREAM_HOSTS.get(urlparse(url).hostname or "")
+        if source is None:
+            raise requests.ConnectionError(f"No stub upstream for {url}")
+
+        profile = self.profiles.get(source, UpstreamProfile())
+        time.sleep(max(0.0, profile.latency + random.uniform(-profile.jitter, profile.jitter)))
+
+        failed = random.random() < profile.error_rate
+        with self._lock:
+            self.calls[source] += 1
+            self.errors[source] += failed
+
+        if failed and random.random() < 0.5:
+            raise requests.ConnectionError(f"Stub upstream {source} dropped the connection")
+
+        response = requests.Response()
+        response.url = url
+        response.status_code = 503 if failed else 200
+        response._content = b"" if failed else self.bodies[source]
+        response.encoding = "utf-8"
+        return response
+
+    @contextmanager
+    def install(self) -> Iterator["StubUpstreams"]:
+        original = trend_service.requests.get
+        trend_service.requests.get = self.get
+        try:
+            yield self
+        finally:
+            trend_service.requests.get = original
+
+
+# ============================================
+# Load Generator
+# ============================================
+
+@dataclass
+class LoadTestConfig:
+    concurrency: int = 20
+    duration: float = 20.0
+    warmup: float = 2.0
+    mix: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    latency: float = 0.2
+    jitter: float = 0.1
+    error_rate: float = 0.0
+    upstreams: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    base_url: Optional[str] = None
+    # Distinct client addresses shared by the workers (in-process only); defaults to one per worker
+    clients: Optional[int] = None
+    # Admission control overrides (in-process only); None keeps the app's settings
+    snapshot_ttl: Optional[float] = None
+    client_rate: Optional[float] = None
+    client_burst: Optional[float] = None
+
+    def profiles(self) -> Dict[str, UpstreamProfile]:
+        profiles = {}
+        for source in set(UPSTREAM_HOSTS.values()):
+            base = {"latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate}
+            base.update(self.upstreams.get(source, {}))
+            profiles[source] = UpstreamProfile(**base)
+        return profiles
+
+
+def _pick_request(mix: Dict[str, int], rng: random.Random) -> tuple:
+    """Return (endpoint name, path) for the next request"""
+    endpoint = rng.choices(list(mix), weights=list(mix.values()))[0]
+    if endpoint == "trends":
+        return endpoint, f"/api/trends?limit=50&k12_only={rng.choice(['true', 'false'])}"
+    if endpoint == "source":
+        return endpoint, f"/api/trends/{rng.choice(list(trend_service.SCRAPERS))}"
+    if endpoint == "health":
+        return endpoint, "/api/health"
+    raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+
+
+def _classify(response: httpx.Response) -> str:
+    """Tell live scrapes apart from snapshot hits and shed requests"""
+    if response.status_code in (429, 503) and "retry-after" in response.headers:
+        return "shed"
+    if response.status_code >= 400:
+        return "error"
+    try:
+        meta = response.json().get("meta") or {}
+    except ValueError:
+        meta = {}
+    if meta.get("stale"):
+        return "stale"
+    if meta.get("from_snapshot"):
+        return "cached"
+    return "live"
+
+
+async def _worker(client: httpx.AsyncClient, config: LoadTestConfig, deadline: float,
+                  measure_from: float, samples: Dict[str, List], seed: int) -> None:
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        endpoint, path = _pick_request(config.mix, rng)
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            latency = time.perf_counter() - start
+            outcome = _classify(response)
+        except httpx.HTTPError:
+            latency = time.perf_counter() - start
+            outcome = "error"
+        if start >= measure_from:
+            samples.setdefault(endpoint, []).append((latency, outcome))
+
+
+async def _lag_probe(deadline: float, measure_from: float, lags: List[float]) -> None:
+    """Measure how late the event loop wakes up from a short sleep"""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        if start >= measure_from:
+            lags.append(time.perf_counter() - start - LAG_PROBE_INTERVAL)
+
+
+def _summarize(latencies: np.ndarray, outcomes: np.ndarray, window: float) -> Dict:
+    if latencies.size == 0:
+        return {"requests": 0}
+    ms = latencies * 1000
+    failed = (outcomes == "shed") | (outcomes == "error")
+    return {
+        "requests": int(latencies.size),
+        "throughput_rps": round(latencies.size / window, 2),
+        "error_rate": round(float(failed.mean()), 4),
+        "outcomes": {name: int((outcomes == name).sum()) for name in OUTCOMES},
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def _configure_admission(config: LoadTestConfig) -> None:
+    """Apply admission overrides to the in-process app before any request"""
+    from main import admission
+
+    if config.snapshot_ttl is not None:
+        admission.ttl = config.snapshot_ttl
+    if config.client_rate is not None:
+        admission.buckets.rate = config.client_rate
+    if config.client_burst is not None:
+        admission.buckets.capacity = config.client_burst
+
+
+def _client_address(index: int) -> tuple:
+    return (f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256 + 1}", 40000 + index % 20000)
+
+
+async def run_load_test(config: LoadTestConfig) -> Dict:
+    """Run one load test and return the report"""
+    if config.base_url:
+        shared = httpx.AsyncClient(base_url=config.base_url, timeout=60)
+        clients = [shared] * config.concurrency
+    else:
+        from main import app
+        _configure_admission(config)
+        # One client address per identity so each gets its own token bucket
+        identities = config.clients or config.concurrency
+        by_identity = [
+            httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app, client=_client_address(i)),
+                base_url="http://loadtest",
+                timeout=60,
+            )
+            for i in range(identities)
+        ]
+        clients = [by_identity[seed % identities] for seed in range(config.concurrency)]
+
+    samples: Dict[str, List] = {}
+    lags: List[float] = []
+    started = time.perf_counter()
+    measure_from = started + config.warmup
+    deadline = measure_from + config.duration
+
+    try:
+        await asyncio.gather(
+            _lag_probe(deadline, measure_from, lags),
+            *(
+                _worker(clients[seed], config, deadline, measure_from, samples, seed)
+                for seed in range(config.concurrency)
+            ),
+        )
+    finally:
+        for client in set(clients):
+            await client.aclose()
+
+    window = config.duration
+    endpoints = {}
+    all_latencies, all_outcomes = [], []
+    for endpoint, rows in sorted(samples.items()):
+        latencies = np.array([r[0] for r in rows])
+        outcomes = np.array([r[1] for r in rows])
+        endpoints[endpoint] = _summarize(latencies, outcomes, window)
+        all_latencies.append(latencies)
+        all_outcomes.append(outcomes)
+
+    lag_ms = np.array(lags) * 1000
+    return {
+        "overall": _summarize(
+            np.concatenate(all_latencies) if all_latencies else np.zeros(0),
+            np.concatenate(all_outcomes) if all_outcomes else np.zeros(0, dtype=str),
+            window,
+        ),
+        "endpoints": endpoints,
+        "event_loop_lag": {
+            "p50_ms": round(float(np.percentile(lag_ms, 50)), 2) if lag_ms.size else None,
+            "p99_ms": round(float(np.percentile(lag_ms, 99)), 2) if lag_ms.size else None,
+            "max_ms": round(float(lag_ms.max()), 2) if lag_ms.size else None,
+        },
+    }
+
+
+# ============================================
+# Reporting
+# ============================================
+
+def _git_revision() -> Dict[str, object]:
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=False,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+
+    return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+
+
+def print_report(report: Dict) -> None:
+    print("\n" + "=" * 78)
+    print(f"{'endpoint':<10}{'requests':>10}{'rps':>10}{'errors':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    print("-" * 78)
+    for name, stats in [*report["endpoints"].items(), ("overall", report["overall"])]:
+        if not stats.get("requests"):
+            print(f"{name:<10}{0:>10}")
+            continue
+        print(
+            f"{name:<10}{stats['requests']:>10}{stats['throughput_rps']:>10.1f}"
+            f"{stats['error_rate']:>8.1%} {stats['p50_ms']:>9.1f}{stats['p95_ms']:>10.1f}"
+            f"{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+        )
+    print("-" * 78)
+    print(f"{'endpoint':<10}" + "".join(f"{name:>10}" for name in OUTCOMES))
+    for name, stats in [*report["endpoints"].items(), ("overall", report["overall"])]:
+        if stats.get("requests"):
+            counts = stats["outcomes"]
+            print(f"{name:<10}" + "".join(f"{counts[o] / stats['requests']:>10.1%}" for o in OUTCOMES))
+    lag = report["event_loop_lag"]
+    print("-" * 78)
+    print(f"event loop lag (ms): p50={lag['p50_ms']} p99={lag['p99_ms']} max={lag['max_ms']}")
+    print("=" * 78 + "\n")
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def _parse_upstream(value: str) -> tuple:
+    source, _, settings = value.partition(":")
+    overrides = {}
+    for part in filter(None, settings.split(",")):
+        key, _, number = part.partition("=")
+        if key not in UpstreamProfile.__dataclass_fields__:
+            raise argparse.ArgumentTypeError(f"Unknown upstream setting: {key}")
+        overrides[key] = float(number)
+    return source, overrides
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Load test the trends API with stand-in upstreams")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before measuring")
+    parser.add_argument("--mix", type=_parse_mix, default=dict(DEFAULT_MIX),
+                        help="Request mix, e.g. trends=6,source=3,health=1")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Upstream latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Upstream error probability")
+    parser.add_argument("--upstream", type=_parse_upstream, action="append", default=[],
+                        help="Per-source override, e.g. zhihu:latency=1.5,error_rate=0.3")
+    parser.add_argument("--clients", type=int, default=None,
+                        help="Distinct client addresses shared by the workers (default: one per worker)")
+    parser.add_argument("--snapshot-ttl", type=float, default=None,
+                        help="Override SNAPSHOT_TTL; 0 sends every read through admission control")
+    parser.add_argument("--client-rate", type=float, default=None, help="Override CLIENT_RATE (scrapes/s)")
+    parser.add_argument("--client-burst", type=float, default=None, help="Override CLIENT_BURST")
+    parser.add_argument("--base-url", default=None,
+                        help="Hit a running server instead (upstream stubs are not applied)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON lines file to append results to")
+    args = parser.parse_args(argv)
+
+    config = LoadTestConfig(
+        concurrency=args.concurrency,
+        duration=args.duration,
+        warmup=args.warmup,
+        mix=args.mix,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        upstreams=dict(args.upstream),
+        base_url=args.base_url,
+        clients=args.clients,
+        snapshot_ttl=args.snapshot_ttl,
+        client_rate=args.client_rate,
+        client_burst=args.client_burst,
+    )
+
+    print(f"🧅 Load testing {config.base_url or 'main:app (in-process)'} "
+          f"with {config.concurrency} clients for {config.duration:.0f}s...")
+
+    stubs = StubUpstreams(config.profiles())
+    with stubs.install():
+        report = asyncio.run(run_load_test(config))
+
+    report = {
+        "timestamp": time.time(),
+        **_git_revision(),
+        "config": asdict(config),
+        **report,
+        "upstream_calls": stubs.calls,
+        "upstream_errors": stubs.errors,
+    }
+    print_report(report)
+
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    print(f"📝 Results appended to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
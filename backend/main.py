@@ -5,17 +5,27 @@ Onion Daily Trend Catcher - API Server
 Run with: uvicorn main:app --reload --port 8000
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import time
 
 from trend_service import (
     fetch_china_trends,
     fetch_trends_by_source,
+    store,
     K12_KEYWORDS
 )
+from admission import AdmissionController, Priority, Shed
+from export import FORMATS, DEFAULT_CHUNK_ROWS, stream_export
+from history import parse_time
+from tracing import TRACE_ALLOW_FORCED_SAMPLING, get_logger, start_trace
+
+logger = get_logger(__name__)
 
 # ============================================
 # FastAPI App Setup
@@ -38,9 +48,149 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Open a trace per request and return its id in X-Trace-Id"""
+    incoming_id = request.headers.get("x-trace-id", "")
+    trace_id = incoming_id if incoming_id.isalnum() and len(incoming_id) <= 64 else None
+    # Clients can force sampling of a single request when debugging is enabled
+    forced = TRACE_ALLOW_FORCED_SAMPLING and request.headers.get("x-trace-sampled") == "1"
+    sampled = True if forced else None
+    
+    with start_trace(
+        f"{request.method} {request.url.path}",
+        trace_id=trace_id,
+        sampled=sampled,
+        query=str(request.query_params),
+    ) as trace_id:
+        response = await call_next(request)
+    
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
+
+# ============================================
+# Admission Control
+# ============================================
+
+admission = AdmissionController()
+
+# Scrapes in progress keyed by source (None for all sources); concurrent cache
+# misses join the running scrape instead of starting another one
+_scrapes_in_flight: Dict[Optional[str], "asyncio.Task"] = {}
+
+
+def client_id(request: Request) -> str:
+    """Key for per-client rate limiting"""
+    return request.client.host if request.client else "unknown"
+
+
+async def load_trends(
+    request: Request,
+    response: Response,
+    source: Optional[str] = None,
+) -> Tuple[List[Dict], Dict]:
+    """
+    Get trends for all sources (or one) through admission control
+    
+    Fresh snapshot data is served without touching upstream. Otherwise the
+    request joins the scrape already in flight for the same source, or the
+    client is charged a token and starts one once an upstream slot is free;
+    if either is unavailable the stale snapshot is served with Retry-After,
+    or 429/503 when there is nothing to serve yet.
+    
+    Returns:
+        (trends, snapshot meta for the response)
+    """
+    def cached() -> List[Dict]:
+        return store.source_items(source) if source else store.merged()
+    
+    def is_fresh() -> bool:
+        refreshed_at = store.source_fetched_at(source) if source else store.refreshed_at
+        return admission.is_fresh(refreshed_at)
+    
+    def served(trends: List[Dict], mode: str) -> Tuple[List[Dict], Dict]:
+        from_snapshot = mode != "live"
+        # Sources actually present in the data and when each was scraped: a
+        # source that failed recently keeps an older board, then drops out
+        fetched = {source: store.source_fetched_at(source)} if source else store.fetched_times()
+        return trends, {
+            "sources": list(fetched),
+            "source_fetched_at": fetched,
+            "from_snapshot": from_snapshot,
+            "stale": mode == "stale",
+            "snapshot_at": (store.source_fetched_at(source) if source else store.updated_at()) if from_snapshot else None,
+        }
+    
+    if store.warm or is_fresh():
+        trends = cached()
+        if trends:
+            return served(trends, "cached")
+    
+    async def scrape(client: str) -> Tuple[List[Dict], str]:
+        async with admission.upstream_slot(Priority.INTERACTIVE, client=client):
+            # Another request may have refreshed the snapshot while we waited
+            if is_fresh():
+                return cached(), "cached"
+            if source:
+                return await run_in_threadpool(fetch_trends_by_source, source), "live"
+            return await run_in_threadpool(fetch_china_trends, parallel=True), "live"
+    
+    try:
+        flight = _scrapes_in_flight.get(source)
+        if flight is None:
+            client = client_id(request)
+            admission.check_client(client)
+            flight = _scrapes_in_flight[source] = asyncio.ensure_future(scrape(client))
+            flight.add_done_callback(lambda _: _scrapes_in_flight.pop(source, None))
+        # Shielded so one caller disconnecting does not cancel the scrape for everyone
+        return served(*await asyncio.shield(flight))
+    
+    except Shed as e:
+        logger.info("request_shed", reason=e.reason, client=client_id(request), source=source)
+        headers = {"Retry-After": str(e.retry_after)}
+        trends = cached()
+        if not trends:
+            raise HTTPException(
+                status_code=429 if e.reason == "client rate limited" else 503,
+                detail=f"Request not admitted ({e.reason}), retry later",
+                headers=headers,
+            )
+        response.headers.update(headers)
+        return served(trends, "stale")
+
+
+# ============================================
+# Warm Start
+# ============================================
+
+async def refresh_snapshot():
+    """Bring a checkpoint loaded at boot up to date with a live scrape"""
+    with start_trace("warm_start_refresh"):
+        try:
+            async with admission.upstream_slot(Priority.BACKGROUND):
+                await run_in_threadpool(fetch_china_trends, parallel=True)
+        except Shed as e:
+            logger.warning("warm_start_refresh_shed", reason=e.reason)
+        except Exception:
+            logger.exception("warm_start_refresh_failed")
+        finally:
+            # Whatever happened, stop serving the checkpoint as if it were fresh;
+            # later requests go through the normal TTL / admission path
+            store.warm = False
+
+
+@app.on_event("startup")
+async def warm_start():
+    """Load the last snapshot so the first request is served without a cold scrape"""
+    if store.load():
+        app.state.refresh_task = asyncio.create_task(refresh_snapshot())
+
+
 # ============================================
 # API Endpoints
 # ============================================
@@ -55,6 +205,8 @@ async def root():
         "endpoints": [
             "/api/trends",
             "/api/trends/{source}",
+            "/api/trends/batch",
+            "/api/export",
             "/api/health",
         ]
     }
@@ -67,14 +219,18 @@ async def health_check():
         "status": "healthy",
         "timestamp": time.time(),
         "sources": ["weibo", "baidu", "zhihu", "360"],
+        "admission": admission.stats(),
     }
 
 
 @app.get("/api/trends")
 async def get_trends(
+    request: Request,
+    response: Response,
     limit: int = Query(default=50, ge=1, le=100, description="Max number of trends to return"),
     k12_only: bool = Query(default=False, description="Return only K12-related trends"),
     source: Optional[str] = Query(default=None, description="Filter by source (weibo/baidu/zhihu/360)"),
+    sort: str = Query(default="default", description="Sort order (default/relevance)"),
 ):
     """
     Fetch aggregated trends from all Chinese sources
@@ -82,21 +238,30 @@ async def get_trends(
     - **limit**: Maximum number of trends to return (1-100)
     - **k12_only**: If true, return only education-related trends
     - **source**: Optional filter by specific source
+    - **sort**: `default` (K12 first, then hot score) or `relevance` (ranking model)
     """
+    valid_sorts = ["default", "relevance"]
+    if sort not in valid_sorts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort. Must be one of: {valid_sorts}"
+        )
+    
+    valid_sources = ["weibo", "baidu", "zhihu", "360"]
+    if source and source not in valid_sources:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid source. Must be one of: {valid_sources}"
+        )
+    
     try:
-        # Fetch all trends
-        if source:
-            # Fetch from specific source only
-            valid_sources = ["weibo", "baidu", "zhihu", "360"]
-            if source not in valid_sources:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid source. Must be one of: {valid_sources}"
-                )
-            trends = fetch_trends_by_source(source)
-        else:
-            # Fetch from all sources
-            trends = fetch_china_trends(parallel=True)
+        # All sources, or one source only; served from the snapshot when fresh
+        trends, snapshot_meta = await load_trends(request, response, source)
+        
+        # Rank the whole snapshot before filtering so scores are comparable
+        if sort == "relevance":
+            from ranking import rank_trends  # numpy is loaded on first use
+            trends = rank_trends(trends)
         
         # Filter K12 only if requested
         if k12_only:
@@ -110,14 +275,136 @@ async def get_trends(
             "count": len(trends),
             "data": trends,
             "meta": {
-                "sources": ["weibo", "baidu", "zhihu", "360"] if not source else [source],
                 "k12_filtered": k12_only,
+                "sort": sort,
+                **snapshot_meta,
                 "timestamp": time.time(),
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ API Error: {e}")
+        logger.exception("api_error", endpoint="/api/trends", source=source)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch trends: {str(e)}"
+        )
+
+
+# ============================================
+# Batch Queries
+# ============================================
+
+class TrendQuery(BaseModel):
+    key: Optional[str] = Field(default=None, description="Response key; derived from the query if omitted")
+    source: Optional[str] = Field(default=None, description="Filter by source (weibo/baidu/zhihu/360)")
+    k12_only: bool = False
+    limit: int = Field(default=50, ge=1, le=100)
+    sort: str = Field(default="default", description="Sort order (default/relevance)")
+
+    def response_key(self) -> str:
+        return self.key or f"{self.source or 'all'}:{'k12' if self.k12_only else 'any'}:{self.limit}:{self.sort}"
+
+
+class BatchTrendsRequest(BaseModel):
+    queries: List[TrendQuery] = Field(..., min_length=1, max_length=20)
+
+
+def resolve_queries(snapshot: List[Dict], queries: List[TrendQuery]) -> Dict[str, Dict]:
+    """
+    Answer every query from one snapshot
+
+    Each ordering (default / relevance, all sources / one source) is built
+    at most once and shared by every query that needs it.
+    """
+    views: Dict[tuple, List[Dict]] = {}
+
+    def view(source: Optional[str], sort: str) -> List[Dict]:
+        key = (source, sort)
+        if key in views:
+            return views[key]
+        if source is None:
+            if sort == "relevance":
+                from ranking import rank_trends  # numpy is loaded on first use
+                views[key] = rank_trends(snapshot)
+            else:
+                # The snapshot already comes in the merged default order
+                views[key] = snapshot
+        elif sort == "relevance":
+            # Filter the globally ranked list so scores stay comparable across tabs
+            views[key] = [t for t in view(None, "relevance") if t["source"] == source]
+        else:
+            # Board order, matching /api/trends/{source}
+            views[key] = sorted(
+                (t for t in snapshot if t["source"] == source),
+                key=lambda t: -t.get("hot_score", 0),
+            )
+        return views[key]
+
+    results = {}
+    for query in queries:
+        trends = view(query.source, query.sort)
+        if query.k12_only:
+            trends = [t for t in trends if t.get("is_k12_related", False)]
+        trends = trends[:query.limit]
+        results[query.response_key()] = {
+            "count": len(trends),
+            "data": trends,
+            "query": query.model_dump(exclude={"key"}),
+        }
+    return results
+
+
+@app.post("/api/trends/batch")
+async def get_trends_batch(batch: BatchTrendsRequest, request: Request, response: Response):
+    """
+    Resolve several trend queries against one shared snapshot
+    
+    - **queries**: List of `{key, source, k12_only, limit, sort}` specs
+    
+    All sources are fetched at most once per batch, so every tab of the
+    dashboard shows the same snapshot.
+    """
+    valid_sources = ["weibo", "baidu", "zhihu", "360"]
+    valid_sorts = ["default", "relevance"]
+    
+    keys = set()
+    for query in batch.queries:
+        if query.source is not None and query.source not in valid_sources:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid source '{query.source}'. Must be one of: {valid_sources}"
+            )
+        if query.sort not in valid_sorts:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid sort '{query.sort}'. Must be one of: {valid_sorts}"
+            )
+        key = query.response_key()
+        if key in keys:
+            raise HTTPException(status_code=400, detail=f"Duplicate query key: {key}")
+        keys.add(key)
+    
+    try:
+        snapshot, snapshot_meta = await load_trends(request, response)
+        results = resolve_queries(snapshot, batch.queries)
+        
+        return {
+            "success": True,
+            "count": len(results),
+            "results": results,
+            "meta": {
+                "snapshot_size": len(snapshot),
+                **snapshot_meta,
+                "timestamp": time.time(),
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("api_error", endpoint="/api/trends/batch")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch trends: {str(e)}"
@@ -126,6 +413,8 @@ async def get_trends(
 
 @app.get("/api/trends/{source}")
 async def get_trends_by_source(
+    request: Request,
+    response: Response,
     source: str,
     limit: int = Query(default=15, ge=1, le=50),
 ):
@@ -144,7 +433,7 @@ async def get_trends_by_source(
         )
     
     try:
-        trends = fetch_trends_by_source(source)
+        trends, snapshot_meta = await load_trends(request, response, source)
         trends = trends[:limit]
         
         return {
@@ -152,16 +441,59 @@ async def get_trends_by_source(
             "source": source,
             "count": len(trends),
             "data": trends,
+            "meta": snapshot_meta,
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ API Error for {source}: {e}")
+        logger.exception("api_error", endpoint="/api/trends/{source}", source=source)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch {source} trends: {str(e)}"
         )
 
 
+@app.get("/api/export")
+async def export_trends(
+    format: str = Query(default="jsonl", description="Export format (jsonl/parquet/arrow)"),
+    since: Optional[str] = Query(default=None, description="Unix timestamp or ISO date"),
+    until: Optional[str] = Query(default=None, description="Unix timestamp or ISO date"),
+    source: Optional[List[str]] = Query(default=None, description="Only export these sources"),
+    chunk_rows: int = Query(default=DEFAULT_CHUNK_ROWS, ge=1000, le=500_000),
+):
+    """
+    Stream collected trend history for offline analysis
+    
+    - **format**: `jsonl` (gzip JSON lines), `parquet` or `arrow` (IPC stream)
+    - **since** / **until**: Snapshot time range
+    - **source**: Repeatable source filter
+    """
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format. Must be one of: {list(FORMATS)}"
+        )
+    
+    try:
+        since_ts = parse_time(since) if since else None
+        until_ts = parse_time(until) if until else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {e}")
+    
+    try:
+        chunks = stream_export(format, since_ts, until_ts, source, chunk_rows)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    _, media_type, extension = FORMATS[format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="trends{extension}"'},
+    )
+
+
 @app.get("/api/keywords")
 async def get_k12_keywords():
     """Get the list of K12 keywords used for filtering"""
@@ -0,0 +1,264 @@
+"""
+洋葱热点灵感捕手 - 热点相关性排序
+Onion Daily Trend Catcher - Relevance Ranking Model
+
+Scores a whole snapshot of trends in one batched NumPy pass:
+
+    score = w_topic    * cos(tfidf(title), K12 centroid)
+          + w_source   * source weight
+          + w_position * position decay within the source board
+          + w_recency  * recency decay
+
+Title vectors are TF-IDF over character n-grams, kept in coordinate form
+(row, column, value) so the similarity to the centroid is a couple of
+`np.bincount` calls instead of a dense item x vocabulary matrix.
+"""
+
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tracing import get_logger
+from trend_service import K12_KEYWORDS
+
+logger = get_logger(__name__)
+
+# ============================================
+# Configuration
+# ============================================
+
+# Environment variable holding a JSON object of RankingWeights overrides,
+# e.g. RANKING_WEIGHTS='{"topic": 0.6, "source_weights": {"360": 0.5}}'
+RANKING_WEIGHTS_ENV = "RANKING_WEIGHTS"
+
+# Character n-gram sizes used for title vectors (Chinese titles have no spaces)
+NGRAM_RANGE = (1, 2)
+
+
+@dataclass
+class RankingWeights:
+    topic: float = 0.55          # similarity to the K12 topic centroid
+    source: float = 0.10         # per-platform trust / reach
+    position: float = 0.25       # rank on the source's own board
+    recency: float = 0.10        # freshness of the scrape
+    position_tau: float = 5.0    # board rank at which position decay reaches 1/e
+    half_life: float = 6 * 3600  # seconds until recency decays to 0.5
+    source_weights: Dict[str, float] = field(default_factory=lambda: {
+        "weibo": 1.0,
+        "baidu": 1.0,
+        "zhihu": 0.9,
+        "360": 0.7,
+    })
+
+    @classmethod
+    def from_env(cls) -> "RankingWeights":
+        """Build weights from defaults overridden by $RANKING_WEIGHTS"""
+        weights = cls()
+        raw = os.environ.get(RANKING_WEIGHTS_ENV)
+        if not raw:
+            return weights
+
+        overrides = json.loads(raw)
+        for key, value in overrides.items():
+            if not hasattr(weights, key):
+                raise ValueError(f"Unknown ranking weight: {key}")
+            if key == "source_weights":
+                weights.source_weights = {
+                    **weights.source_weights,
+                    **{source: float(w) for source, w in value.items()},
+                }
+            else:
+                setattr(weights, key, float(value))
+
+        # NaN or infinite weights (and non-positive divisors) make every score NaN
+        values = {key: v for key, v in weights.to_dict().items() if key != "source_weights"}
+        values.update({f"source_weights.{k}": v for k, v in weights.source_weights.items()})
+        for key, value in values.items():
+            if not math.isfinite(value):
+                raise ValueError(f"Ranking weight {key} must be finite")
+        for key in ("position_tau", "half_life"):
+            if getattr(weights, key) <= 0:
+                raise ValueError(f"Ranking weight {key} must be positive")
+        return weights
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _default_weights() -> RankingWeights:
+    """Weights from $RANKING_WEIGHTS, or the built-in defaults if it is invalid"""
+    try:
+        return RankingWeights.from_env()
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning("ranking_weights_invalid", env=RANKING_WEIGHTS_ENV, error=str(e))
+        return RankingWeights()
+
+
+DEFAULT_WEIGHTS = _default_weights()
+
+
+# ============================================
+# TF-IDF Vectorization
+# ============================================
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> List[str]:
+    """Split text into overlapping character n-grams, ignoring whitespace"""
+    text = "".join(text.split()).lower()
+    lo, hi = ngram_range
+    return [
+        text[i:i + n]
+        for n in range(lo, hi + 1)
+        for i in range(len(text) - n + 1)
+    ]
+
+
+def _tfidf_coo(docs: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Vectorize documents into L2-normalized TF-IDF rows in coordinate form
+
+    Returns:
+        (rows, cols, values, vocabulary_size)
+    """
+    vocab: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+
+    for row, doc in enumerate(docs):
+        for gram in char_ngrams(doc):
+            rows.append(row)
+            cols.append(vocab.setdefault(gram, len(vocab)))
+
+    n_docs = len(docs)
+    n_terms = len(vocab)
+    if not rows:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty, n_terms
+
+    rows_arr = np.asarray(rows, dtype=np.int64)
+    cols_arr = np.asarray(cols, dtype=np.int64)
+
+    # Collapse repeated (row, col) pairs into term counts
+    keys, tf = np.unique(rows_arr * n_terms + cols_arr, return_counts=True)
+    rows_arr, cols_arr = np.divmod(keys, n_terms)
+
+    # Smoothed IDF, as in scikit-learn: log((1 + n) / (1 + df)) + 1
+    df = np.bincount(cols_arr, minlength=n_terms)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+    values = tf * idf[cols_arr]
+    norms = np.sqrt(np.bincount(rows_arr, weights=values * values, minlength=n_docs))
+    values = values / norms[rows_arr]
+
+    return rows_arr, cols_arr, values, n_terms
+
+
+def topic_similarity(titles: Sequence[str], keywords: Sequence[str] = K12_KEYWORDS) -> np.ndarray:
+    """
+    Cosine similarity of each title to the centroid of the keyword vectors
+
+    Titles and keywords share one vocabulary and IDF so the centroid lives
+    in the same space as the snapshot being ranked.
+    """
+    n_titles = len(titles)
+    if n_titles == 0:
+        return np.zeros(0)
+
+    rows, cols, values, n_terms = _tfidf_coo(list(titles) + list(keywords))
+
+    is_keyword = rows >= n_titles
+    centroid = np.bincount(cols[is_keyword], weights=values[is_keyword], minlength=n_terms)
+    centroid_norm = np.linalg.norm(centroid)
+    if centroid_norm == 0:
+        return np.zeros(n_titles)
+    centroid /= centroid_norm
+
+    is_title = ~is_keyword
+    return np.bincount(
+        rows[is_title],
+        weights=values[is_title] * centroid[cols[is_title]],
+        minlength=n_titles,
+    )
+
+
+# ============================================
+# Ranking
+# ============================================
+
+def score_trends(
+    trends: Sequence[Dict],
+    weights: Optional[RankingWeights] = None,
+    now: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Compute relevance scores for a snapshot of trend dicts
+
+    Args:
+        trends: Trend dictionaries as returned by TrendItem.to_dict()
+        weights: Ranking weights, defaults to DEFAULT_WEIGHTS
+        now: Reference time for recency, defaults to time.time()
+
+    Returns:
+        Array of scores aligned with `trends`
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    now = time.time() if now is None else now
+    n = len(trends)
+    if n == 0:
+        return np.zeros(0)
+
+    topic = topic_similarity([t.get("title", "") for t in trends])
+
+    # Source weights and codes for per-source normalization
+    source_names = [t.get("source", "") for t in trends]
+    source_index: Dict[str, int] = {}
+    source_codes = np.fromiter(
+        (source_index.setdefault(s, len(source_index)) for s in source_names),
+        dtype=np.int64,
+        count=n,
+    )
+    source_table = np.array(
+        [weights.source_weights.get(s, 0.5) for s in source_index], dtype=np.float64
+    )
+    source = source_table[source_codes]
+
+    # Board position: 0 for each source's top item, whatever its raw hot_score scale
+    hot = np.fromiter((t.get("hot_score", 0) for t in trends), dtype=np.float64, count=n)
+    source_top = np.full(len(source_index), -np.inf)
+    np.maximum.at(source_top, source_codes, hot)
+    rank = source_top[source_codes] - hot
+    position = np.exp(-rank / weights.position_tau)
+
+    # Recency: items without a scrape timestamp count as fresh
+    fetched = np.fromiter((t.get("fetched_at") or now for t in trends), dtype=np.float64, count=n)
+    age = np.clip(now - fetched, 0.0, None)
+    recency = np.exp(-math.log(2) * age / weights.half_life)
+
+    return (
+        weights.topic * topic
+        + weights.source * source
+        + weights.position * position
+        + weights.recency * recency
+    )
+
+
+def rank_trends(
+    trends: Sequence[Dict],
+    weights: Optional[RankingWeights] = None,
+    now: Optional[float] = None,
+) -> List[Dict]:
+    """
+    Return trends sorted by relevance, each annotated with `relevance_score`
+
+    The input dicts are not modified.
+    """
+    scores = score_trends(trends, weights=weights, now=now)
+    order = np.argsort(-scores, kind="stable")
+    return [
+        {**trends[i], "relevance_score": round(float(scores[i]), 4)}
+        for i in order
+    ]
@@ -0,0 +1,275 @@
+"""
+洋葱热点灵感捕手 - 最新快照存储
+Onion Daily Trend Catcher - Latest Snapshot Store
+
+Keeps the most recent trends per source in memory and checkpoints them to
+a single compact JSON file, written atomically (temp file + rename). On
+startup the checkpoint is loaded so the first request can be served
+without waiting for a cold scrape.
+
+The merged ranking across sources is maintained incrementally: items are
+keyed by (source, id) and ordered in a SortedList, so a source refresh only
+touches the items that appeared, disappeared or moved (O(delta log n))
+instead of rebuilding and re-sorting the combined list.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# ============================================
+# Configuration
+# ============================================
+
+# Checkpoint file; set to an empty string to disable persistence
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshot.json"))
+
+# Bump when the on-disk layout changes; mismatched files are ignored
+SNAPSHOT_VERSION = 1
+
+# Seconds a source's last good board is kept once its scrapes start failing;
+# older boards are dropped from the merged view (0 keeps them forever)
+SOURCE_MAX_AGE = float(os.environ.get("SOURCE_MAX_AGE", "3600"))
+
+
+def default_sort_key(trend: Dict):
+    """Default ordering: K12-related first, then by hot score"""
+    return (not trend.get("is_k12_related", False), -trend.get("hot_score", 0))
+
+
+def merge_key(source: str, trend: Dict) -> Tuple:
+    """
+    Position of a trend in the merged view
+
+    Ends with (source, id), which identifies the entry: ids are only unique
+    within a source, and also break ties deterministically.
+    """
+    return (*default_sort_key(trend), source, trend["id"])
+
+
+@dataclass
+class SourceSnapshot:
+    source: str
+    items: List[Dict]
+    fetched_at: float
+    by_id: Dict[str, Dict]
+
+
+class SnapshotStore:
+    """Latest trends per source, shared by every request"""
+
+    def __init__(self, path: Optional[str] = SNAPSHOT_PATH):
+        self.path = path
+        self._sources: Dict[str, SourceSnapshot] = {}
+        # Merged view across sources: (source, id) -> trend, (source, id) -> merge key,
+        # and the ordered keys
+        self._items: Dict[Tuple[str, str], Dict] = {}
+        self._keys: Dict[Tuple[str, str], Tuple] = {}
+        self._order = SortedList()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # True while serving a checkpoint loaded from disk that no live scrape has replaced yet
+        self.warm = False
+        # When the last live aggregation of all sources finished
+        self.refreshed_at: Optional[float] = None
+
+    # ------------------------------------------
+    # Reads
+    # ------------------------------------------
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return list(self._sources)
+
+    def updated_at(self) -> Optional[float]:
+        """Oldest fetch time across sources, i.e. how stale the merged view is"""
+        with self._lock:
+            if not self._sources:
+                return None
+            return min(s.fetched_at for s in self._sources.values())
+
+    def source_fetched_at(self, source: str) -> Optional[float]:
+        with self._lock:
+            snapshot = self._sources.get(source)
+            return snapshot.fetched_at if snapshot else None
+
+    def fetched_times(self) -> Dict[str, float]:
+        """Fetch time of every source currently in the merged view"""
+        with self._lock:
+            return {name: s.fetched_at for name, s in self._sources.items()}
+
+    def source_items(self, source: str) -> List[Dict]:
+        with self._lock:
+            snapshot = self._sources.get(source)
+            return list(snapshot.items) if snapshot else []
+
+    def merged(self) -> List[Dict]:
+        """All sources combined in the default order"""
+        with self._lock:
+            return [self._items[key[-2:]] for key in self._order]
+
+    # ------------------------------------------
+    # Writes
+    # ------------------------------------------
+
+    def update(self, source: str, items: List[Dict], fetched_at: Optional[float] = None) -> int:
+        """
+        Replace one source's trends, applying only the delta to the merged view
+
+        Empty results are ignored: the scrapers return [] on failure, and a
+        stale board is more useful than an empty one.
+
+        Returns:
+            Number of items inserted, removed or moved in the merged view
+        """
+        if not items:
+            return 0
+
+        # Keep board order so per-source reads match the scraper's output
+        items = sorted(items, key=lambda t: -t.get("hot_score", 0))
+        current = {t["id"]: t for t in items}
+
+        with self._lock:
+            previous = self._sources.get(source)
+            changed = self._apply_delta(source, previous.by_id if previous else {}, current)
+            self._sources[source] = SourceSnapshot(
+                source=source,
+                items=items,
+                fetched_at=time.time() if fetched_at is None else fetched_at,
+                by_id=current,
+            )
+        return changed
+
+    def _apply_delta(self, source: str, previous: Dict[str, Dict], current: Dict[str, Dict]) -> int:
+        """Move the merged view from `previous` to `current` for one source (lock held)"""
+        changed = 0
+        for item_id in previous.keys() - current.keys():
+            entry = (source, item_id)
+            self._order.remove(self._keys.pop(entry))
+            del self._items[entry]
+            changed += 1
+
+        for item_id, trend in current.items():
+            entry = (source, item_id)
+            key = merge_key(source, trend)
+            old_key = self._keys.get(entry)
+            if key != old_key:
+                if old_key is not None:
+                    self._order.remove(old_key)
+                self._order.add(key)
+                self._keys[entry] = key
+                changed += 1
+            # Same position: just swap in the fresh dict (new fetched_at, url, ...)
+            self._items[entry] = trend
+        return changed
+
+    def evict_expired(self, max_age: float = SOURCE_MAX_AGE, now: Optional[float] = None) -> List[str]:
+        """
+        Drop sources whose board is older than `max_age` from the store
+
+        `update` keeps a failed source's previous board; this bounds how long
+        it can linger in the merged view.
+
+        Returns:
+            Names of the evicted sources
+        """
+        if max_age <= 0:
+            return []
+        now = time.time() if now is None else now
+
+        with self._lock:
+            expired = [name for name, s in self._sources.items() if now - s.fetched_at > max_age]
+            for name in expired:
+                self._apply_delta(name, self._sources.pop(name).by_id, {})
+
+        for name in expired:
+            logger.warning("source_evicted", source=name, max_age=max_age)
+        return expired
+
+    def mark_live(self) -> None:
+        """Record that a live aggregation has refreshed the store"""
+        self.warm = False
+        self.refreshed_at = time.time()
+
+    # ------------------------------------------
+    # Persistence
+    # ------------------------------------------
+
+    def save(self) -> bool:
+        """Atomically checkpoint the store to `path`"""
+        if not self.path:
+            return False
+
+        # Capture the state under the save lock so concurrent checkpoints land
+        # in order and an older state never replaces a newer file; readers
+        # only wait on the in-memory copy, never on disk I/O
+        directory = os.path.dirname(self.path) or "."
+        with self._save_lock:
+            with self._lock:
+                payload = {
+                    "version": SNAPSHOT_VERSION,
+                    "saved_at": time.time(),
+                    "sources": {
+                        name: {"fetched_at": s.fetched_at, "items": s.items}
+                        for name, s in self._sources.items()
+                    },
+                }
+            data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except OSError as e:
+                logger.warning("snapshot_save_failed", path=self.path, error=str(e))
+                return False
+
+        logger.debug("snapshot_saved", path=self.path, size=len(data))
+        return True
+
+    def load(self) -> bool:
+        """Load the checkpoint from `path`; returns True if anything was loaded"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, "rb") as f:
+                payload = json.loads(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning("snapshot_load_failed", path=self.path, error=str(e))
+            return False
+
+        if payload.get("version") != SNAPSHOT_VERSION:
+            logger.warning("snapshot_version_mismatch", path=self.path, version=payload.get("version"))
+            return False
+
+        for name, s in payload.get("sources", {}).items():
+            self.update(name, s.get("items", []), fetched_at=s.get("fetched_at"))
+        self.evict_expired()
+        self.warm = bool(self.sources())
+
+        logger.info(
+            "snapshot_loaded",
+            path=self.path,
+            sources=len(self.sources()),
+            saved_at=payload.get("saved_at"),
+        )
+        return self.warm
@@ -0,0 +1,108 @@
+"""
+Test script for the incremental snapshot store
+Run: python test_snapshot.py
+"""
+
+from snapshot import SnapshotStore, default_sort_key
+from trend_service import generate_id
+
+
+def make_trend(source: str, title: str, hot_score: int, k12: bool = False) -> dict:
+    return {
+        "id": generate_id(source, title),
+        "title": title,
+        "url": "",
+        "source": source,
+        "category": "",
+        "hot_score": hot_score,
+        "is_k12_related": k12,
+    }
+
+
+def board(source: str, titles: list) -> list:
+    return [make_trend(source, t, len(titles) - i) for i, t in enumerate(titles)]
+
+
+def check_consistent(store: SnapshotStore) -> None:
+    """The merged view must equal a full re-sort of every source's board"""
+    merged = store.merged()
+    expected = [t for s in store.sources() for t in store.source_items(s)]
+    assert sorted(map(id, merged)) == sorted(map(id, expected)), "merged view lost or duplicated items"
+    keys = [default_sort_key(t) for t in merged]
+    assert keys == sorted(keys), "merged view out of order"
+
+
+def test_delta_apply():
+    store = SnapshotStore(path=None)
+    store.update("weibo", board("weibo", ["a", "b", "c"]))
+    store.update("baidu", board("baidu", ["d", "e"]))
+    check_consistent(store)
+
+    # Re-ranked board: only moved items count as changes
+    changed = store.update("weibo", board("weibo", ["c", "b", "a"]))
+    assert changed == 2, changed
+    check_consistent(store)
+
+    # Identical board: nothing moves
+    assert store.update("baidu", board("baidu", ["d", "e"])) == 0
+    check_consistent(store)
+
+
+def test_removal():
+    store = SnapshotStore(path=None)
+    store.update("weibo", board("weibo", ["a", "b", "c"]))
+    store.update("weibo", board("weibo", ["b", "d"]))
+    titles = [t["title"] for t in store.merged()]
+    assert sorted(titles) == ["b", "d"], titles
+    check_consistent(store)
+
+    # An empty (failed) scrape keeps the previous board
+    assert store.update("weibo", []) == 0
+    assert len(store.merged()) == 2
+
+
+def test_eviction():
+    store = SnapshotStore(path=None)
+    store.update("weibo", board("weibo", ["a", "b"]), fetched_at=1000.0)
+    store.update("baidu", board("baidu", ["c"]), fetched_at=5000.0)
+
+    assert store.evict_expired(max_age=3600, now=5000.0) == ["weibo"]
+    assert store.sources() == ["baidu"]
+    assert [t["title"] for t in store.merged()] == ["c"]
+    check_consistent(store)
+
+    assert store.evict_expired(max_age=0, now=1e12) == []
+
+
+def test_cross_source_ids():
+    # Sources outside the built-in prefixes share an id prefix, so the same
+    # title yields the same id on both
+    store = SnapshotStore(path=None)
+    assert generate_id("douyin", "同名话题") == generate_id("bilibili", "同名话题")
+    store.update("douyin", board("douyin", ["同名话题", "x"]))
+    store.update("bilibili", board("bilibili", ["同名话题", "y"]))
+    assert len(store.merged()) == 4
+    check_consistent(store)
+
+    # Dropping the title from one source must not touch the other's copy
+    store.update("douyin", board("douyin", ["x"]))
+    assert [t["source"] for t in store.merged() if t["title"] == "同名话题"] == ["bilibili"]
+    store.update("bilibili", board("bilibili", ["y", "同名话题"]))
+    check_consistent(store)
+
+    assert store.evict_expired(max_age=1, now=1e12) == ["douyin", "bilibili"]
+    assert store.merged() == []
+
+
+if __name__ == "__main__":
+    print("\n🧅 洋葱热点灵感捕手 - Snapshot Store Test Suite")
+    print("=" * 60)
+
+    for test in (test_delta_apply, test_removal, test_eviction, test_cross_source_ids):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+
+    print("=" * 60 + "\n")
@@ -0,0 +1,339 @@
+"""
+洋葱热点灵感捕手 - 结构化日志与请求追踪
+Onion Daily Trend Catcher - Structured Logging & Tracing
+
+Log records and finished spans are handed to a queue and written by a
+background listener thread, so hot paths never block on stdout or disk.
+
+Usage:
+    from tracing import get_logger, start_trace, span
+
+    logger = get_logger(__name__)
+
+    with start_trace("GET /api/trends"):
+        with span("fetch", source="weibo"):
+            ...
+        logger.info("source_fetched", source="weibo", count=15)
+
+Convert a trace dump for chrome://tracing or https://ui.perfetto.dev:
+    python tracing.py traces.jsonl > trace.json
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# ============================================
+# Configuration
+# ============================================
+
+# Minimum level for application logs (DEBUG/INFO/WARNING/ERROR)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# Fraction of traces whose spans are recorded (0.0 - 1.0)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+
+# JSON lines file that sampled spans are appended to
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces.jsonl"))
+
+# Size at which TRACE_FILE is rotated to TRACE_FILE.1 (one backup is kept)
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Honour the X-Trace-Sampled request header; off by default so clients
+# cannot force every request into the trace file
+TRACE_ALLOW_FORCED_SAMPLING = os.environ.get("TRACE_ALLOW_FORCED_SAMPLING", "0") == "1"
+
+# Root logger name for everything in the backend
+LOGGER_NAMESPACE = "onion"
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("trace_sampled", default=False)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+# ============================================
+# Structured Logging
+# ============================================
+
+class JsonFormatter(logging.Formatter):
+    """Render a log record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = getattr(record, "span_id", None)
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them
+
+    The stock QueueHandler formats in the calling thread; here we only stamp
+    the trace context and leave formatting to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.trace_id = _trace_id.get()
+        current = _current_span.get()
+        record.span_id = current.span_id if current else None
+        return record
+
+
+class StructuredLogger:
+    """Thin wrapper that turns keyword arguments into structured fields"""
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, exc_info: bool, fields: Dict[str, Any]) -> None:
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, event, False, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self._log(logging.INFO, event, False, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self._log(logging.WARNING, event, False, fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self._log(logging.ERROR, event, False, fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        self._log(logging.ERROR, event, True, fields)
+
+
+_setup_lock = threading.Lock()
+_listeners: List[logging.handlers.QueueListener] = []
+_span_queue: Optional[queue.SimpleQueue] = None
+# Cleared if the span writer fails, so spans stop piling up in the queue
+_spans_enabled = True
+
+
+def setup_logging() -> None:
+    """Start the background log and span writers (idempotent)"""
+    global _span_queue
+
+    with _setup_lock:
+        if _listeners:
+            return
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(JsonFormatter())
+
+        root = logging.getLogger(LOGGER_NAMESPACE)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(ContextQueueHandler(log_queue))
+        root.propagate = False
+
+        _span_queue = queue.SimpleQueue()
+        _listeners.append(logging.handlers.QueueListener(log_queue, stream_handler))
+        _listeners.append(_SpanListener(_span_queue, TRACE_FILE))
+
+        for listener in _listeners:
+            listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer threads"""
+    with _setup_lock:
+        while _listeners:
+            _listeners.pop().stop()
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Get a structured logger under the backend namespace"""
+    setup_logging()
+    if not name.startswith(LOGGER_NAMESPACE):
+        name = f"{LOGGER_NAMESPACE}.{name}"
+    return StructuredLogger(name)
+
+
+# ============================================
+# Tracing
+# ============================================
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start: float
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    duration_ms: float = 0.0
+    status: str = "ok"
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+class _SpanListener(logging.handlers.QueueListener):
+    """Append finished spans to a JSON lines file from a background thread"""
+
+    def __init__(self, span_queue: queue.SimpleQueue, path: str):
+        super().__init__(span_queue)
+        self.path = path
+        self._file = None
+
+    def handle(self, span: Span) -> None:
+        global _spans_enabled
+        if not _spans_enabled:
+            return  # keep draining whatever was queued before the writer died
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            elif self._file.tell() >= TRACE_FILE_MAX_BYTES:
+                self._rotate()
+            self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+            # Only flush once the queue has drained to batch writes under load
+            if self.queue.empty():
+                self._file.flush()
+        except Exception as e:
+            _spans_enabled = False
+            logging.getLogger(LOGGER_NAMESPACE).error(
+                "trace_writer_disabled", extra={"fields": {"path": self.path, "error": str(e)}}
+            )
+
+    def _rotate(self) -> None:
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def stop(self) -> None:
+        super().stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@contextmanager
+def start_trace(
+    name: str,
+    trace_id: Optional[str] = None,
+    sampled: Optional[bool] = None,
+    **attrs: Any,
+) -> Iterator[str]:
+    """
+    Open a new trace with a root span
+
+    Every log record inside carries the trace id; spans are only recorded
+    when the trace is sampled (TRACE_SAMPLE_RATE unless forced).
+    """
+    trace_id = trace_id or uuid.uuid4().hex
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+
+    id_token = _trace_id.set(trace_id)
+    sampled_token = _sampled.set(sampled)
+    try:
+        with span(name, **attrs):
+            yield trace_id
+    finally:
+        _sampled.reset(sampled_token)
+        _trace_id.reset(id_token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Record a child span of the current span
+
+    Yields None (and costs almost nothing) when there is no sampled trace.
+    """
+    if not _sampled.get() or not _spans_enabled:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        trace_id=_trace_id.get(),
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        name=name,
+        start=time.time(),
+        attrs=attrs,
+    )
+    token = _current_span.set(current)
+    t0 = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attrs["error"] = repr(e)
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - t0) * 1000
+        _current_span.reset(token)
+        if _span_queue is not None:
+            _span_queue.put_nowait(current)
+
+
+# ============================================
+# Trace Viewer Export
+# ============================================
+
+def to_chrome_trace(lines: Iterator[str]) -> Dict:
+    """Convert dumped spans to the Chrome trace event format"""
+    events = []
+    thread_ids: Dict[str, int] = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        s = json.loads(line)
+        events.append({
+            "name": s["name"],
+            "ph": "X",
+            "ts": s["start"] * 1e6,
+            "dur": s["duration_ms"] * 1e3,
+            "pid": 1,
+            "tid": thread_ids.setdefault(s["trace_id"], len(thread_ids) + 1),
+            "args": {**s["attrs"], "trace_id": s["trace_id"], "status": s["status"]},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE
+    with open(path, encoding="utf-8") as f:
+        json.dump(to_chrome_trace(f), sys.stdout, ensure_ascii=False)
@@ -6,15 +6,22 @@ Supports: Weibo, Baidu, Zhihu, 360 Search
 """
 
 import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import Callable, List, Dict, Optional
+from dataclasses import dataclass, field
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import contextvars
 import hashlib
 import time
 import json
 import re
 
+from history import record_snapshot
+from snapshot import SnapshotStore
+from tracing import get_logger, span
+
+logger = get_logger(__name__)
+
 # ============================================
 # Configuration
 # ============================================
@@ -55,6 +62,7 @@ class TrendItem:
     category: str = "24h"
     hot_score: int = 0
     is_k12_related: bool = False
+    fetched_at: float = field(default_factory=time.time)
 
     def to_dict(self) -> Dict:
         return {
@@ -65,9 +73,12 @@ class TrendItem:
             "category": self.category,
             "hot_score": self.hot_score,
             "is_k12_related": self.is_k12_related,
+            "fetched_at": self.fetched_at,
         }
 
 
+# Titles repeat across refreshes, so derived fields are memoized per title
+@lru_cache(maxsize=8192)
 def generate_id(source: str, title: str) -> str:
     """Generate unique ID based on source and title hash"""
     hash_str = hashlib.md5(title.encode()).hexdigest()[:8]
@@ -75,11 +86,18 @@ def generate_id(source: str, title: str) -> str:
     return f"{prefix}_{hash_str}"
 
 
+@lru_cache(maxsize=8192)
 def check_k12_related(title: str) -> bool:
     """Check if title contains K12 education keywords"""
     return any(keyword in title for keyword in K12_KEYWORDS)
 
 
+def parse_html(text: str):
+    """Parse HTML with lxml; bs4 and lxml are imported on first use to keep startup fast"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(text, features='lxml')
+
+
 def get_headers(referer: Optional[str] = None) -> Dict[str, str]:
     """Get common request headers"""
     headers = {
@@ -104,55 +122,57 @@ def fetch_weibo_trends() -> List[TrendItem]:
     Fetch trending topics from Weibo Hot Search
     URL: https://s.weibo.com/top/summary
     """
-    print("📡 Fetching Weibo trends...")
+    logger.debug("source_fetch_start", source="weibo")
     trends = []
     
     try:
         url = "https://s.weibo.com/top/summary"
         headers = get_headers(referer="https://s.weibo.com/")
         
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+        with span("fetch", source="weibo", url=url):
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
         response.encoding = 'utf-8'
         
-        soup = BeautifulSoup(response.text, features='lxml')
+        with span("parse", source="weibo"):
+            soup = parse_html(response.text)
         
-        # Find hot search items - they are in td.td-02 > a
-        items = soup.select('td.td-02 > a')
+            # Find hot search items - they are in td.td-02 > a
+            items = soup.select('td.td-02 > a')
         
-        for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
-            title = item.get_text(strip=True)
-            href = item.get('href', '')
+            for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
+                title = item.get_text(strip=True)
+                href = item.get('href', '')
             
-            # Skip empty titles
-            if not title:
-                continue
+                # Skip empty titles
+                if not title:
+                    continue
             
-            # Build full URL
-            if href.startswith('/'):
-                full_url = f"https://s.weibo.com{href}"
-            elif not href.startswith('http'):
-                full_url = f"https://s.weibo.com/weibo?q={title}"
-            else:
-                full_url = href
+                # Build full URL
+                if href.startswith('/'):
+                    full_url = f"https://s.weibo.com{href}"
+                elif not href.startswith('http'):
+                    full_url = f"https://s.weibo.com/weibo?q={title}"
+                else:
+                    full_url = href
             
-            trend = TrendItem(
-                id=generate_id("weibo", title),
-                title=title,
-                url=full_url,
-                source="weibo",
-                category="24h",
-                hot_score=MAX_ITEMS_PER_SOURCE - idx,
-                is_k12_related=check_k12_related(title)
-            )
-            trends.append(trend)
-        
-        print(f"✅ Weibo: Found {len(trends)} trends")
+                trend = TrendItem(
+                    id=generate_id("weibo", title),
+                    title=title,
+                    url=full_url,
+                    source="weibo",
+                    category="24h",
+                    hot_score=MAX_ITEMS_PER_SOURCE - idx,
+                    is_k12_related=check_k12_related(title)
+                )
+                trends.append(trend)
+        
+        logger.info("source_fetched", source="weibo", count=len(trends))
         
     except requests.RequestException as e:
-        print(f"❌ Weibo fetch failed: {e}")
-    except Exception as e:
-        print(f"❌ Weibo parse error: {e}")
+        logger.warning("source_fetch_failed", source="weibo", error=str(e))
+    except Exception:
+        logger.exception("source_parse_failed", source="weibo")
     
     return trends
 
@@ -166,65 +186,67 @@ def fetch_baidu_trends() -> List[TrendItem]:
     Fetch trending topics from Baidu Hot Search
     URL: https://top.baidu.com/board?tab=realtime
     """
-    print("📡 Fetching Baidu trends...")
+    logger.debug("source_fetch_start", source="baidu")
     trends = []
     
     try:
         url = "https://top.baidu.com/board?tab=realtime"
         headers = get_headers(referer="https://www.baidu.com/")
         
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+        with span("fetch", source="baidu", url=url):
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
         response.encoding = 'utf-8'
         
-        soup = BeautifulSoup(response.text, features='lxml')
+        with span("parse", source="baidu"):
+            soup = parse_html(response.text)
         
-        # Baidu uses div.c-single-text-ellipsis for titles in their cards
-        # The structure may vary, try multiple selectors
-        items = soup.select('.content_1YWBm .c-single-text-ellipsis')
+            # Baidu uses div.c-single-text-ellipsis for titles in their cards
+            # The structure may vary, try multiple selectors
+            items = soup.select('.content_1YWBm .c-single-text-ellipsis')
         
-        if not items:
-            # Fallback selector - try finding title divs
-            items = soup.select('[class*="title"] .c-single-text-ellipsis')
+            if not items:
+                # Fallback selector - try finding title divs
+                items = soup.select('[class*="title"] .c-single-text-ellipsis')
         
-        if not items:
-            # Another fallback - look for category-wrap items
-            items = soup.select('.category-wrap_iQLoo a[href*="rsv_dl=fyb"]')
+            if not items:
+                # Another fallback - look for category-wrap items
+                items = soup.select('.category-wrap_iQLoo a[href*="rsv_dl=fyb"]')
         
-        for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
-            title = item.get_text(strip=True)
+            for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
+                title = item.get_text(strip=True)
             
-            if not title:
-                continue
+                if not title:
+                    continue
             
-            # Try to find the parent link
-            parent_link = item.find_parent('a')
-            if parent_link:
-                href = parent_link.get('href', '')
-            else:
-                href = f"https://www.baidu.com/s?wd={title}"
+                # Try to find the parent link
+                parent_link = item.find_parent('a')
+                if parent_link:
+                    href = parent_link.get('href', '')
+                else:
+                    href = f"https://www.baidu.com/s?wd={title}"
             
-            # Ensure full URL
-            if href and not href.startswith('http'):
-                href = f"https://www.baidu.com{href}" if href.startswith('/') else f"https://www.baidu.com/s?wd={title}"
+                # Ensure full URL
+                if href and not href.startswith('http'):
+                    href = f"https://www.baidu.com{href}" if href.startswith('/') else f"https://www.baidu.com/s?wd={title}"
             
-            trend = TrendItem(
-                id=generate_id("baidu", title),
-                title=title,
-                url=href or f"https://www.baidu.com/s?wd={title}",
-                source="baidu",
-                category="24h",
-                hot_score=MAX_ITEMS_PER_SOURCE - idx,
-                is_k12_related=check_k12_related(title)
-            )
-            trends.append(trend)
-        
-        print(f"✅ Baidu: Found {len(trends)} trends")
+                trend = TrendItem(
+                    id=generate_id("baidu", title),
+                    title=title,
+                    url=href or f"https://www.baidu.com/s?wd={title}",
+                    source="baidu",
+                    category="24h",
+                    hot_score=MAX_ITEMS_PER_SOURCE - idx,
+                    is_k12_related=check_k12_related(title)
+                )
+                trends.append(trend)
+        
+        logger.info("source_fetched", source="baidu", count=len(trends))
         
     except requests.RequestException as e:
-        print(f"❌ Baidu fetch failed: {e}")
-    except Exception as e:
-        print(f"❌ Baidu parse error: {e}")
+        logger.warning("source_fetch_failed", source="baidu", error=str(e))
+    except Exception:
+        logger.exception("source_parse_failed", source="baidu")
     
     return trends
 
@@ -239,7 +261,7 @@ def fetch_zhihu_trends() -> List[TrendItem]:
     Strategy 1: Try new API endpoint (api.zhihu.com)
     Strategy 2: Fallback to HTML scraping (www.zhihu.com/billboard)
     """
-    print("📡 Fetching Zhihu trends...")
+    logger.debug("source_fetch_start", source="zhihu")
     trends = []
     
     # Strategy 1: Try the new API endpoint
@@ -248,158 +270,161 @@ def fetch_zhihu_trends() -> List[TrendItem]:
         headers = get_headers(referer="https://www.zhihu.com/hot")
         headers["Accept"] = "application/json"
         
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+        with span("fetch", source="zhihu", url=url):
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
         
-        data = response.json()
-        items = data.get('data', [])
+        with span("parse", source="zhihu"):
+            data = response.json()
+            items = data.get('data', [])
         
-        for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
-            target = item.get('target', {})
-            title = target.get('title', '')
+            for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
+                target = item.get('target', {})
+                title = target.get('title', '')
             
-            if not title:
-                continue
+                if not title:
+                    continue
             
-            # Build URL based on item type
-            item_id = target.get('id', '')
-            item_type = target.get('type', 'question')
+                # Build URL based on item type
+                item_id = target.get('id', '')
+                item_type = target.get('type', 'question')
             
-            if item_type == 'answer':
-                question_id = target.get('question', {}).get('id', item_id)
-                item_url = f"https://www.zhihu.com/question/{question_id}/answer/{item_id}"
-            else:
-                item_url = target.get('url', f"https://www.zhihu.com/question/{item_id}")
+                if item_type == 'answer':
+                    question_id = target.get('question', {}).get('id', item_id)
+                    item_url = f"https://www.zhihu.com/question/{question_id}/answer/{item_id}"
+                else:
+                    item_url = target.get('url', f"https://www.zhihu.com/question/{item_id}")
             
-            # Normalize URL
-            if item_url.startswith('//'):
-                item_url = f"https:{item_url}"
-            elif not item_url.startswith('http'):
-                item_url = f"https://www.zhihu.com/question/{item_id}"
+                # Normalize URL
+                if item_url.startswith('//'):
+                    item_url = f"https:{item_url}"
+                elif not item_url.startswith('http'):
+                    item_url = f"https://www.zhihu.com/question/{item_id}"
             
-            trend = TrendItem(
-                id=generate_id("zhihu", title),
-                title=title,
-                url=item_url,
-                source="zhihu",
-                category="24h",
-                hot_score=MAX_ITEMS_PER_SOURCE - idx,
-                is_k12_related=check_k12_related(title)
-            )
-            trends.append(trend)
-        
-        print(f"✅ Zhihu API: Found {len(trends)} trends")
+                trend = TrendItem(
+                    id=generate_id("zhihu", title),
+                    title=title,
+                    url=item_url,
+                    source="zhihu",
+                    category="24h",
+                    hot_score=MAX_ITEMS_PER_SOURCE - idx,
+                    is_k12_related=check_k12_related(title)
+                )
+                trends.append(trend)
+        
+        logger.info("source_fetched", source="zhihu", strategy="api", count=len(trends))
         return trends
         
     except Exception as api_error:
-        print(f"⚠️ Zhihu API failed: {api_error}")
-        print("🔄 Trying HTML scraping fallback...")
+        logger.warning("source_fetch_failed", source="zhihu", strategy="api", error=str(api_error))
     
     # Strategy 2: Fallback to HTML scraping
     try:
         url = "https://www.zhihu.com/billboard"
         headers = get_headers(referer="https://www.zhihu.com/")
         
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+        with span("fetch", source="zhihu", url=url):
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
         response.encoding = 'utf-8'
         
-        soup = BeautifulSoup(response.text, features='lxml')
-        
-        # Try multiple selectors for Zhihu hot list items
-        # Method 1: Look for HotList-item class
-        items = soup.select('.HotList-item')
-        
-        if not items:
-            # Method 2: Look for Billboard-item class
-            items = soup.select('.Billboard-item')
-        
-        if not items:
-            # Method 3: Try to find script with initialData
-            scripts = soup.find_all('script')
-            for script in scripts:
-                if script.string and 'initialData' in script.string:
-                    # Try to extract JSON data
-                    try:
-                        # Find JSON structure in script
-                        match = re.search(r'initialData\s*=\s*({.*?});', script.string, re.DOTALL)
-                        if match:
-                            json_data = json.loads(match.group(1))
-                            hot_list = json_data.get('initialState', {}).get('topstory', {}).get('hotList', [])
+        with span("parse", source="zhihu"):
+            soup = parse_html(response.text)
+        
+            # Try multiple selectors for Zhihu hot list items
+            # Method 1: Look for HotList-item class
+            items = soup.select('.HotList-item')
+        
+            if not items:
+                # Method 2: Look for Billboard-item class
+                items = soup.select('.Billboard-item')
+        
+            if not items:
+                # Method 3: Try to find script with initialData
+                scripts = soup.find_all('script')
+                for script in scripts:
+                    if script.string and 'initialData' in script.string:
+                        # Try to extract JSON data
+                        try:
+                            # Find JSON structure in script
+                            match = re.search(r'initialData\s*=\s*({.*?});', script.string, re.DOTALL)
+                            if match:
+                                json_data = json.loads(match.group(1))
+                                hot_list = json_data.get('initialState', {}).get('topstory', {}).get('hotList', [])
                             
-                            for idx, item in enumerate(hot_list[:MAX_ITEMS_PER_SOURCE]):
-                                target = item.get('target', {})
-                                title = target.get('title', '')
-                                item_id = target.get('id', '')
+                                for idx, item in enumerate(hot_list[:MAX_ITEMS_PER_SOURCE]):
+                                    target = item.get('target', {})
+                                    title = target.get('title', '')
+                                    item_id = target.get('id', '')
                                 
-                                if not title:
-                                    continue
+                                    if not title:
+                                        continue
                                 
-                                trend = TrendItem(
-                                    id=generate_id("zhihu", title),
-                                    title=title,
-                                    url=f"https://www.zhihu.com/question/{item_id}",
-                                    source="zhihu",
-                                    category="24h",
-                                    hot_score=MAX_ITEMS_PER_SOURCE - idx,
-                                    is_k12_related=check_k12_related(title)
-                                )
-                                trends.append(trend)
+                                    trend = TrendItem(
+                                        id=generate_id("zhihu", title),
+                                        title=title,
+                                        url=f"https://www.zhihu.com/question/{item_id}",
+                                        source="zhihu",
+                                        category="24h",
+                                        hot_score=MAX_ITEMS_PER_SOURCE - idx,
+                                        is_k12_related=check_k12_related(title)
+                                    )
+                                    trends.append(trend)
                             
-                            if trends:
-                                print(f"✅ Zhihu HTML (initialData): Found {len(trends)} trends")
-                                return trends
-                    except:
-                        pass
-        
-        # If we found items with selectors
-        for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
-            # Try to find title and link
-            title_elem = item.select_one('.HotList-itemTitle, .Billboard-itemTitle, a')
+                                if trends:
+                                    logger.info("source_fetched", source="zhihu", strategy="initial_data", count=len(trends))
+                                    return trends
+                        except:
+                            pass
+        
+            # If we found items with selectors
+            for idx, item in enumerate(items[:MAX_ITEMS_PER_SOURCE]):
+                # Try to find title and link
+                title_elem = item.select_one('.HotList-itemTitle, .Billboard-itemTitle, a')
             
-            if not title_elem:
-                continue
+                if not title_elem:
+                    continue
             
-            title = title_elem.get_text(strip=True)
-            href = title_elem.get('href', '') if title_elem.name == 'a' else ''
+                title = title_elem.get_text(strip=True)
+                href = title_elem.get('href', '') if title_elem.name == 'a' else ''
             
-            # Find link if title element is not a link
-            if not href:
-                link_elem = item.select_one('a')
-                if link_elem:
-                    href = link_elem.get('href', '')
+                # Find link if title element is not a link
+                if not href:
+                    link_elem = item.select_one('a')
+                    if link_elem:
+                        href = link_elem.get('href', '')
             
-            if not title:
-                continue
+                if not title:
+                    continue
             
-            # Build full URL
-            if href.startswith('/'):
-                full_url = f"https://www.zhihu.com{href}"
-            elif href.startswith('//'):
-                full_url = f"https:{href}"
-            elif not href.startswith('http'):
-                # Try to extract question ID from title
-                full_url = f"https://www.zhihu.com/search?q={title}"
-            else:
-                full_url = href
+                # Build full URL
+                if href.startswith('/'):
+                    full_url = f"https://www.zhihu.com{href}"
+                elif href.startswith('//'):
+                    full_url = f"https:{href}"
+                elif not href.startswith('http'):
+                    # Try to extract question ID from title
+                    full_url = f"https://www.zhihu.com/search?q={title}"
+                else:
+                    full_url = href
             
-            trend = TrendItem(
-                id=generate_id("zhihu", title),
-                title=title,
-                url=full_url,
-                source="zhihu",
-                category="24h",
-                hot_score=MAX_ITEMS_PER_SOURCE - idx,
-                is_k12_related=check_k12_related(title)
-            )
-            trends.append(trend)
-        
-        print(f"✅ Zhihu HTML: Found {len(trends)} trends")
+                trend = TrendItem(
+                    id=generate_id("zhihu", title),
+                    title=title,
+                    url=full_url,
+                    source="zhihu",
+                    category="24h",
+                    hot_score=MAX_ITEMS_PER_SOURCE - idx,
+                    is_k12_related=check_k12_related(title)
+                )
+                trends.append(trend)
+        
+        logger.info("source_fetched", source="zhihu", strategy="html", count=len(trends))
         
     except requests.RequestException as e:
-        print(f"❌ Zhihu HTML fetch failed: {e}")
-    except Exception as e:
-        print(f"❌ Zhihu HTML parse error: {e}")
+        logger.warning("source_fetch_failed", source="zhihu", strategy="html", error=str(e))
+    except Exception:
+        logger.exception("source_parse_failed", source="zhihu", strategy="html")
     
     return trends
 
@@ -414,68 +439,70 @@ def fetch_360_trends() -> List[TrendItem]:
     URL: https://news.so.com/hotnews
     Simple HTML structure, good backup source
     """
-    print("📡 Fetching 360 trends...")
+    logger.debug("source_fetch_start", source="360")
     trends = []
     
     try:
         url = "https://news.so.com/hotnews"
         headers = get_headers(referer="https://news.so.com/")
         
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+        with span("fetch", source="360", url=url):
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
         response.encoding = 'utf-8'
         
-        soup = BeautifulSoup(response.text, features='lxml')
+        with span("parse", source="360"):
+            soup = parse_html(response.text)
         
-        # 360 news uses ul.list > li > a structure
-        items = soup.select('ul.list li a')
+            # 360 news uses ul.list > li > a structure
+            items = soup.select('ul.list li a')
         
-        if not items:
-            # Fallback: look for news-title class
-            items = soup.select('.news-title a, .title a, [class*="hot"] a')
+            if not items:
+                # Fallback: look for news-title class
+                items = soup.select('.news-title a, .title a, [class*="hot"] a')
         
-        seen_titles = set()
+            seen_titles = set()
         
-        for idx, item in enumerate(items):
-            if len(trends) >= MAX_ITEMS_PER_SOURCE:
-                break
+            for idx, item in enumerate(items):
+                if len(trends) >= MAX_ITEMS_PER_SOURCE:
+                    break
                 
-            title = item.get_text(strip=True)
-            href = item.get('href', '')
+                title = item.get_text(strip=True)
+                href = item.get('href', '')
             
-            # Skip empty or duplicate titles
-            if not title or title in seen_titles:
-                continue
+                # Skip empty or duplicate titles
+                if not title or title in seen_titles:
+                    continue
             
-            seen_titles.add(title)
+                seen_titles.add(title)
             
-            # Build full URL
-            if href.startswith('//'):
-                full_url = f"https:{href}"
-            elif href.startswith('/'):
-                full_url = f"https://news.so.com{href}"
-            elif not href.startswith('http'):
-                full_url = f"https://www.so.com/s?q={title}"
-            else:
-                full_url = href
+                # Build full URL
+                if href.startswith('//'):
+                    full_url = f"https:{href}"
+                elif href.startswith('/'):
+                    full_url = f"https://news.so.com{href}"
+                elif not href.startswith('http'):
+                    full_url = f"https://www.so.com/s?q={title}"
+                else:
+                    full_url = href
             
-            trend = TrendItem(
-                id=generate_id("360", title),
-                title=title,
-                url=full_url,
-                source="360",
-                category="24h",
-                hot_score=MAX_ITEMS_PER_SOURCE - len(trends),
-                is_k12_related=check_k12_related(title)
-            )
-            trends.append(trend)
-        
-        print(f"✅ 360: Found {len(trends)} trends")
+                trend = TrendItem(
+                    id=generate_id("360", title),
+                    title=title,
+                    url=full_url,
+                    source="360",
+                    category="24h",
+                    hot_score=MAX_ITEMS_PER_SOURCE - len(trends),
+                    is_k12_related=check_k12_related(title)
+                )
+                trends.append(trend)
+        
+        logger.info("source_fetched", source="360", count=len(trends))
         
     except requests.RequestException as e:
-        print(f"❌ 360 fetch failed: {e}")
-    except Exception as e:
-        print(f"❌ 360 parse error: {e}")
+        logger.warning("source_fetch_failed", source="360", error=str(e))
+    except Exception:
+        logger.exception("source_parse_failed", source="360")
     
     return trends
 
@@ -484,6 +511,27 @@ def fetch_360_trends() -> List[TrendItem]:
 # Main Aggregator
 # ============================================
 
+# Latest trends per source, checkpointed to disk for warm starts
+store = SnapshotStore()
+
+# Source name -> scraper; looked up at call time so it can be swapped out
+SCRAPERS: Dict[str, Callable[[], List[TrendItem]]] = {
+    "weibo": fetch_weibo_trends,
+    "baidu": fetch_baidu_trends,
+    "zhihu": fetch_zhihu_trends,
+    "360": fetch_360_trends,
+}
+
+
+def _run_scraper(source: str, scraper: Callable[[], List[TrendItem]]) -> List[TrendItem]:
+    """Run one scraper inside its own tracing span"""
+    with span("source", source=source) as current:
+        trends = scraper()
+        if current:
+            current.set(count=len(trends))
+        return trends
+
+
 def fetch_china_trends(parallel: bool = True) -> List[Dict]:
     """
     Fetch and aggregate trends from all Chinese sources
@@ -494,75 +542,88 @@ def fetch_china_trends(parallel: bool = True) -> List[Dict]:
     Returns:
         List of trend dictionaries, sorted by relevance and hot score
     """
-    print("\n" + "=" * 50)
-    print("🚀 Starting China Trends Aggregation...")
-    print("=" * 50 + "\n")
+    logger.debug("aggregation_start", parallel=parallel)
     
     start_time = time.time()
-    all_trends: List[TrendItem] = []
+    fresh: List[Dict] = []
     
-    scrapers = [
-        ("weibo", fetch_weibo_trends),
-        ("baidu", fetch_baidu_trends),
-        ("zhihu", fetch_zhihu_trends),
-        ("360", fetch_360_trends),
-    ]
+    scrapers = list(SCRAPERS.items())
+    
+    def merge(source: str, trends: List[TrendItem]) -> None:
+        # Apply this source's delta to the persistent merged view as soon as it arrives
+        with span("merge", source=source, count=len(trends)) as current:
+            results = [trend.to_dict() for trend in trends]
+            changed = store.update(source, results)
+            fresh.extend(results)
+            if current:
+                current.set(changed=changed)
     
     if parallel:
         # Parallel execution for better performance
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        with ThreadPoolExecutor(max_workers=len(scrapers)) as executor:
+            # Copy the context so worker threads inherit the request's trace
             future_to_source = {
-                executor.submit(scraper): source 
+                executor.submit(contextvars.copy_context().run, _run_scraper, source, scraper): source
                 for source, scraper in scrapers
             }
             
             for future in as_completed(future_to_source):
                 source = future_to_source[future]
                 try:
-                    trends = future.result()
-                    all_trends.extend(trends)
-                except Exception as e:
-                    print(f"❌ {source} scraper crashed: {e}")
+                    merge(source, future.result())
+                except Exception:
+                    logger.exception("scraper_crashed", source=source)
     else:
         # Sequential execution (for debugging)
         for source, scraper in scrapers:
             try:
-                trends = scraper()
-                all_trends.extend(trends)
-            except Exception as e:
-                print(f"❌ {source} scraper crashed: {e}")
+                merge(source, _run_scraper(source, scraper))
+            except Exception:
+                logger.exception("scraper_crashed", source=source)
     
-    # Sort: K12-related first, then by hot_score
-    all_trends.sort(key=lambda x: (not x.is_k12_related, -x.hot_score))
+    # Already ordered: K12-related first, then by hot_score. A source that
+    # failed this round keeps its last good board until it is SOURCE_MAX_AGE old.
+    store.evict_expired()
+    results = store.merged()
     
     elapsed = time.time() - start_time
     
-    print("\n" + "=" * 50)
-    print(f"✨ Aggregation Complete!")
-    print(f"📊 Total trends: {len(all_trends)}")
-    print(f"🎓 K12-related: {sum(1 for t in all_trends if t.is_k12_related)}")
-    print(f"⏱️ Time elapsed: {elapsed:.2f}s")
-    print("=" * 50 + "\n")
+    logger.info(
+        "aggregation_complete",
+        total=len(results),
+        fresh=len(fresh),
+        k12_related=sum(1 for t in results if t["is_k12_related"]),
+        elapsed_ms=round(elapsed * 1000, 1),
+    )
+    
+    with span("record_history", count=len(fresh)):
+        record_snapshot(fresh)
+    
+    # Checkpoint the shared snapshot for warm starts
+    with span("checkpoint"):
+        store.mark_live()
+        store.save()
     
-    # Convert to dict format for JSON response
-    return [trend.to_dict() for trend in all_trends]
+    return results
 
 
 def fetch_trends_by_source(source: str) -> List[Dict]:
     """Fetch trends from a specific source"""
-    scrapers = {
-        "weibo": fetch_weibo_trends,
-        "baidu": fetch_baidu_trends,
-        "zhihu": fetch_zhihu_trends,
-        "360": fetch_360_trends,
-    }
-    
-    scraper = scrapers.get(source)
+    scraper = SCRAPERS.get(source)
     if not scraper:
         raise ValueError(f"Unknown source: {source}")
     
-    trends = scraper()
-    return [trend.to_dict() for trend in trends]
+    trends = _run_scraper(source, scraper)
+    results = [trend.to_dict() for trend in trends]
+    
+    with span("record_history", count=len(results)):
+        record_snapshot(results)
+    
+    with span("checkpoint"):
+        store.update(source, results)
+        store.save()
+    
+    return results
 
 
 # ============================================
@@ -570,6 +631,13 @@ def fetch_trends_by_source(source: str) -> List[Dict]:
 # ============================================
 
 if __name__ == "__main__":
+    import sys
+    
+    # Bulk export of collected history: python trend_service.py export --help
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        from export import main as export_main
+        sys.exit(export_main(sys.argv[2:]))
+    
     # Test the aggregator
     trends = fetch_china_trends(parallel=True)
     